@@ -81,4 +81,21 @@ Ensure each event is clearly introduced and offers an angle for readers to consi
         self.volume_threshold_to_send_noti = float(os.getenv("VOLUME_THRESHOLD_TO_SEND_NOTI"))
         self.poly_win_loss_discord_webhook_url = os.getenv("POLY_WIN_LOSS_DISCORD_WEBHOOK_URL")
 
+        self.tpsl_shadow_collection_name = "tpsl_polyxbt_shadow"
+        self.shadow_strategies = os.getenv("SHADOW_STRATEGIES")
+        self.shadow_send_discord = os.getenv("SHADOW_SEND_DISCORD", "false").lower() == "true"
+        self.poly_shadow_discord_webhook_url = os.getenv("POLY_SHADOW_DISCORD_WEBHOOK_URL")
+
+        self.log_level = os.getenv("LOG_LEVEL", "INFO").upper()
+        self.log_hold_sample_every = int(os.getenv("LOG_HOLD_SAMPLE_EVERY", 100))
+
+        self.checkpoint_path = os.getenv("CHECKPOINT_PATH")
+        self.checkpoint_max_age = float(os.getenv("CHECKPOINT_MAX_AGE_SECONDS", 6 * 60 * 60))
+
+        self.profile_ticks = int(os.getenv("PROFILE_TICKS", 0))
+        self.profile_signal_ticks = int(os.getenv("PROFILE_SIGNAL_TICKS", 1))
+        self.profile_dir = os.getenv("PROFILE_DIR", "profiles")
+        self.profile_top_n = int(os.getenv("PROFILE_TOP_N", 20))
+        self.profile_sample_interval = float(os.getenv("PROFILE_SAMPLE_INTERVAL", 0.005))
+
 settings = Settings()
\ No newline at end of file
@@ -1,25 +1,41 @@
-from dataclasses import dataclass
+from collections import Counter, defaultdict
+from dataclasses import dataclass, replace
 from typing import List, Optional, Tuple, Dict, Any
 from datetime import datetime
 import json
 import logging
 import asyncio
+import time
 from enum import Enum
 
+from pymongo import UpdateOne
+
 from app.database.mongodb import AsyncMongoManager
 from app.constants.database import (
     DISTILLED_DATABASE_NAME, 
     DISTILLED_TEST_DATABASE_NAME
 )
 from app.config import settings
-from app.utils.discord import sent_poly_win_loss_discord
+from app.utils.discord import sent_poly_win_loss_discord, sent_poly_shadow_discord
+from app.utils.logger import setup_logging, hold_sampler
+from app.utils.checkpoint import load_checkpoint, save_checkpoint
+from app.utils.profiler import profiler
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+setup_logging()
 logger = logging.getLogger(__name__)
 
+LIVE_STRATEGY = "live"
+
+# Only the event fields the bot reads, so the per-tick event load stays small
+EVENT_PROJECTION = {
+    "hash_id": 1,
+    "title": 1,
+    "slug": 1,
+    "markets.id": 1,
+    "markets.question": 1,
+    "markets.outcomePrices": 1,
+}
+
 class Position(str, Enum):
     OPEN = "OPEN"
     CLOSE = "CLOSE"
@@ -50,16 +66,44 @@ class TradeData:
     option: str
     curr_odds: Optional[List[float]] = None
 
+@dataclass
+class PositionState:
+    highest_profit: float = 0
+    closed: bool = False
+
+def load_shadow_configs(raw: Optional[str]) -> Dict[str, TradingConfig]:
+    """Parse shadow strategies from a JSON object of name -> TradingConfig fields.
+
+    An invalid value is logged and ignored, so a bad experiment never stops the live strategy.
+    """
+    if not raw:
+        return {}
+    try:
+        configs = {name: TradingConfig(**params) for name, params in json.loads(raw).items()}
+        if LIVE_STRATEGY in configs:
+            raise ValueError(f"Shadow strategy name '{LIVE_STRATEGY}' is reserved")
+    except (ValueError, TypeError, AttributeError) as e:
+        logger.error("Invalid SHADOW_STRATEGIES, running without shadow strategies: %s", e)
+        return {}
+    return configs
+
+# Validated once when the cron process starts
+SHADOW_CONFIGS = load_shadow_configs(settings.shadow_strategies)
+
 class TradingBot:
     def __init__(
         self,
         main_client: AsyncMongoManager,
         test_client: AsyncMongoManager,
-        config: TradingConfig
+        config: TradingConfig,
+        shadow_configs: Optional[Dict[str, TradingConfig]] = None
     ):
         self.mongo_client = main_client
         self.test_mongo_client = test_client
         self.config = config
+        self.shadow_configs = shadow_configs or {}
+        self.tick_counts: Dict[str, Counter] = defaultdict(Counter)
+        self.shadow_alerts: List[Tuple[str, TradeData, Dict[str, Any], float, Decision]] = []
         
     @staticmethod
     def calculate_profit(
@@ -75,8 +119,7 @@ class TradingBot:
         
         if 1 in curr_odds:
             position = 'WIN' if curr_odds[prediction_idx] == 1 else 'LOSS'
-            # logger.info(f'Event closed with profit {profit:.2%}, Position: {position}')
-            print(f'Event closed with profit {profit:.2%}, Position: {position}')
+            logger.debug('Event closed with profit %.2f%%, Position: %s', profit * 100, position)
             
         return profit
 
@@ -84,39 +127,191 @@ class TradingBot:
         outcome_prices_text = f"{entry_odds}, means having {round(entry_odds[prediction_idx]*100, 2)}% chance of winning ${(1-entry_odds[prediction_idx])/entry_odds[prediction_idx]} for every $1"
         return outcome_prices_text
     
-    async def get_current_odds(self,trade: TradeData, hash_id: str, option_id: str) -> List[float]:
-        """Fetch current odds from the database."""
-        event = await self.mongo_client.find_one(
-            settings.poly_events_collection_name,
-            {"hash_id": hash_id}
-        )
+    @staticmethod
+    def parse_current_odds(trade: TradeData, event: Optional[Dict[str, Any]]) -> List[float]:
+        """Extract current odds for the trade's option from an already loaded event."""
         if not event:
-            raise ValueError(f"Event not found for hash_id: {hash_id}")
+            raise ValueError(f"Event not found for hash_id: {trade.hash_id}")
 
         matching_opt = next(
-            (opt for opt in event['markets'] if str(opt['id']) == str(option_id)),
+            (opt for opt in event['markets'] if str(opt['id']) == str(trade.option_id)),
             None
         )
         if not matching_opt:
-            raise ValueError(f"Option not found for option_id: {option_id} for event {hash_id}")
+            raise ValueError(f"Option not found for option_id: {trade.option_id} for event {trade.hash_id}")
         trade.option = matching_opt['question']
         return [float(odd) for odd in json.loads(matching_opt['outcomePrices'])]
 
-    async def record_tpsl_decision(
+    async def load_events(self, hash_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Load all events needed for this tick in one query, keyed by hash_id."""
+        events = await self.mongo_client.find(
+            settings.poly_events_collection_name,
+            {"hash_id": {"$in": hash_ids}},
+            projection=EVENT_PROJECTION
+        )
+        events_by_hash = {}
+        for event in events:
+            events_by_hash.setdefault(event["hash_id"], event)
+        return events_by_hash
+
+    @staticmethod
+    def merge_position_records(
+        states: Dict[str, PositionState],
+        records: List[Dict[str, Any]]
+    ) -> None:
+        """Fold TPSL records into per-prediction position state."""
+        for record in records:
+            state = states.setdefault(record["prediction_id"], PositionState())
+            state.highest_profit = max(state.highest_profit, record.get('highest_profit') or 0)
+            if record.get('tpsl_open_position') == Position.CLOSE.value:
+                state.closed = True
+
+    async def load_position_states(
+        self,
+        prediction_ids: List[str],
+        since: Optional[float] = None,
+        states: Optional[Dict[str, Dict[str, PositionState]]] = None
+    ) -> Dict[str, Dict[str, PositionState]]:
+        """Load position state for the live strategy and every shadow strategy.
+
+        Costs one query for the live collection and one for the shadow
+        collection, regardless of how many shadow strategies are configured.
+        With `since`, only records updated after that timestamp are read and
+        merged into `states`.
+        """
+        projection = {"prediction_id": 1, "highest_profit": 1, "tpsl_open_position": 1, "strategy": 1}
+        filter = {"prediction_id": {"$in": prediction_ids}}
+        if since is not None:
+            filter["tpsl_update_at"] = {"$gt": since}
+        states = states if states is not None else {}
+        states.setdefault(LIVE_STRATEGY, {})
+        records = await self.mongo_client.find(
+            "tpsl_polyxbt",
+            filter,
+            projection=projection
+        )
+        self.merge_position_records(states[LIVE_STRATEGY], records)
+
+        if self.shadow_configs:
+            records = await self.test_mongo_client.find(
+                settings.tpsl_shadow_collection_name,
+                {**filter, "strategy": {"$in": list(self.shadow_configs)}},
+                projection=projection
+            )
+            for name in self.shadow_configs:
+                states.setdefault(name, {})
+            for record in records:
+                self.merge_position_records(states[record["strategy"]], [record])
+
+        return states
+
+    async def restore_position_states(
+        self,
+        prediction_ids: List[str]
+    ) -> Dict[str, Dict[str, PositionState]]:
+        """Load position state from the local checkpoint plus Mongo changes made since it.
+
+        Falls back to a full load when checkpointing is off, or the checkpoint
+        is missing, too old or lacks one of the configured strategies.
+        """
+        checkpoint = load_checkpoint(settings.checkpoint_path) if settings.checkpoint_path else None
+        if checkpoint:
+            checkpoint_ts, saved = checkpoint
+            strategies = [LIVE_STRATEGY, *self.shadow_configs]
+            is_fresh = datetime.now().timestamp() - checkpoint_ts <= settings.checkpoint_max_age
+            if is_fresh and all(strategy in saved for strategy in strategies):
+                wanted = set(prediction_ids)
+                states = {
+                    strategy: {
+                        prediction_id: PositionState(*state)
+                        for prediction_id, state in saved[strategy].items()
+                        if prediction_id in wanted
+                    }
+                    for strategy in strategies
+                }
+                logger.info("Restored position states from checkpoint taken at %s", checkpoint_ts)
+                return await self.load_position_states(prediction_ids, since=checkpoint_ts, states=states)
+
+        return await self.load_position_states(prediction_ids)
+
+    def save_position_states(
         self,
+        checkpoint_ts: float,
+        states: Dict[str, Dict[str, PositionState]]
+    ) -> None:
+        """Write position states to the local checkpoint, if checkpointing is on."""
+        if not settings.checkpoint_path:
+            return
+        try:
+            save_checkpoint(
+                settings.checkpoint_path,
+                checkpoint_ts,
+                {
+                    strategy: {
+                        prediction_id: (state.highest_profit, state.closed)
+                        for prediction_id, state in strategy_states.items()
+                    }
+                    for strategy, strategy_states in states.items()
+                }
+            )
+        except OSError as e:
+            logger.error("Error saving checkpoint: %s", e, exc_info=True)
+
+    @staticmethod
+    def log_fields(
         trade: TradeData,
-        profit: float,
-        position: Position,
+        strategy: str,
+        position: Optional[Position] = None,
         decision: Optional[Decision] = None,
-        send_discord: bool = False
-    ) -> None:
-        """Record TPSL decision in database."""
-        filter = {
-            'hash_id': trade.hash_id,
+        profit: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Structured fields attached to per-trade log records."""
+        fields = {
+            'strategy': strategy,
             'prediction_id': trade.prediction_id,
+            'hash_id': trade.hash_id,
             'option_id': trade.option_id,
+            'highest_profit': trade.highest_profit,
         }
-        document = {
+        if position is not None:
+            fields['position'] = position.value
+        if decision is not None:
+            fields['decision'] = decision.value
+        if profit is not None:
+            fields['profit'] = profit
+        return fields
+
+    def log_decision(
+        self,
+        trade: TradeData,
+        strategy: str,
+        position: Position,
+        decision: Decision,
+        profit: float
+    ) -> None:
+        """Count one decision and log it, skipping all log work for filtered or sampled-out lines."""
+        self.tick_counts[strategy][decision.value] += 1
+        if logger.isEnabledFor(logging.INFO) and hold_sampler.sample(decision.value):
+            logger.info(
+                "Position %s: %s", position.value, decision.value,
+                extra=self.log_fields(trade, strategy, position, decision, profit)
+            )
+
+    def log_trade_error(self, trade: TradeData, strategy: str, message: str, error: Exception) -> None:
+        """Count one failed trade and log it with its trade fields."""
+        self.tick_counts[strategy]["ERROR"] += 1
+        if logger.isEnabledFor(logging.ERROR):
+            logger.error(message, strategy, error, exc_info=True,
+                         extra=self.log_fields(trade, strategy))
+
+    @staticmethod
+    def build_tpsl_document(
+        trade: TradeData,
+        profit: float,
+        position: Position,
+        decision: Decision
+    ) -> Dict[str, Any]:
+        return {
             "$set":{
                 'hash_id': trade.hash_id,
                 'prediction_id': trade.prediction_id,
@@ -133,14 +328,14 @@ class TradingBot:
             }
         }
         
-        # send to discord
-        event = await self.mongo_client.find_one(
-            settings.poly_events_collection_name,
-            {"hash_id": trade.hash_id}
-        )
-        if decision.value not in ["HOLD"] and trade.volume > 100_000 and send_discord:
-                sent_poly_win_loss_discord(
-                    f"""- Hash ID: {trade.hash_id}
+    async def format_decision_message(
+        self,
+        trade: TradeData,
+        event: Dict[str, Any],
+        profit: float,
+        decision: Decision
+    ) -> str:
+        return f"""- Hash ID: {trade.hash_id}
 - Prediction ID: {trade.prediction_id}
 - Title: {event['title']}
 - URL: {"https://polymarket.com/event/" + event['slug']}
@@ -152,6 +347,28 @@ class TradingBot:
 - Win/Loss: `{decision.value}`
 - Profit: `${profit}`
 """
+
+    async def record_tpsl_decision(
+        self,
+        trade: TradeData,
+        event: Dict[str, Any],
+        profit: float,
+        position: Position,
+        decision: Optional[Decision] = None,
+        send_discord: bool = False
+    ) -> None:
+        """Record TPSL decision in database."""
+        filter = {
+            'hash_id': trade.hash_id,
+            'prediction_id': trade.prediction_id,
+            'option_id': trade.option_id,
+        }
+        document = self.build_tpsl_document(trade, profit, position, decision)
+
+        # send to discord
+        if decision.value not in ["HOLD"] and trade.volume > 100_000 and send_discord:
+                sent_poly_win_loss_discord(
+                    await self.format_decision_message(trade, event, profit, decision)
                 )
         await self.mongo_client.update_one("tpsl_polyxbt",
                                                 filter=filter, 
@@ -169,8 +386,13 @@ class TradingBot:
             {'$set': {"highest_profit": highest_profit}}
         )
 
-    async def evaluate_tpsl(self, trade: TradeData) -> Tuple[Position, Optional[Decision]]:
+    async def evaluate_tpsl(
+        self,
+        trade: TradeData,
+        config: Optional[TradingConfig] = None
+    ) -> Tuple[Position, Optional[Decision]]:
         """Evaluate whether to take profit or stop loss."""
+        config = config or self.config
         profit = self.calculate_profit(
             trade.entry_odds,
             trade.curr_odds,
@@ -178,8 +400,7 @@ class TradingBot:
         )
         
         new_highest_profit = max(trade.highest_profit, profit)
-        logger.info(f"Current profit: {profit:.2%}, Max profit: {new_highest_profit:.2%}")
-        print(f"Current profit: {profit:.2%}, Max profit: {new_highest_profit:.2%}")
+        logger.debug("Current profit: %.2f%%, Max profit: %.2f%%", profit * 100, new_highest_profit * 100)
         if trade.curr_odds[0] == 1 or trade.curr_odds[1] == 1:
             if profit > 0:
                 return Position.CLOSE, Decision.WIN
@@ -189,46 +410,119 @@ class TradingBot:
         # max_profit: trần profit
         max_profit = (1-trade.entry_odds[trade.prediction_idx])/trade.entry_odds[trade.prediction_idx]
 
-        if profit > min(0.2, 0.5*max_profit) and (new_highest_profit - profit)/new_highest_profit > self.config.TAKE_PROFIT_THRESHOLD:
+        if profit > min(0.2, 0.5*max_profit) and (new_highest_profit - profit)/new_highest_profit > config.TAKE_PROFIT_THRESHOLD:
             return Position.CLOSE, Decision.TAKE_PROFIT
         
-        elif profit <= 0 and abs(profit/max_profit) > self.config.STOP_LOSS_THRESHOLD:
+        elif profit <= 0 and abs(profit/max_profit) > config.STOP_LOSS_THRESHOLD:
             return Position.CLOSE, Decision.STOP_LOSS
         
         return Position.OPEN, Decision.HOLD
 
-    async def process_trade(self, trade: TradeData) -> bool:
+    async def process_trade(
+        self,
+        trade: TradeData,
+        event: Optional[Dict[str, Any]],
+        state: Optional[PositionState] = None
+    ) -> bool:
         """Process a single trade with TPSL logic."""
         try:
-            trade.curr_odds = await self.get_current_odds(trade,trade.hash_id, trade.option_id)
+            trade.curr_odds = self.parse_current_odds(trade, event)
             position, decision = await self.evaluate_tpsl(trade)
             curr_profit = self.calculate_profit(trade.entry_odds, 
                                                               trade.curr_odds, 
                                                               trade.prediction_idx)
             await self.record_tpsl_decision(trade, 
+                                          event,
                                           curr_profit,
                                           position,
                                           decision,
                                           send_discord=True)
             
-            if position == Position.CLOSE:
-                # logger.info(f"Position closed: {decision.value}")
-                print(f"Position closed: {decision.value}")
-            else:
-                # logger.info("Position held")
-                print("Position held")
-                
             await self.update_highest_profit(trade.prediction_id, 
                                        max(trade.highest_profit, 
                                            curr_profit))
+            if state is not None:
+                state.highest_profit = max(trade.highest_profit, curr_profit)
+                state.closed = position == Position.CLOSE
+
+            self.log_decision(trade, LIVE_STRATEGY, position, decision, curr_profit)
             return True
             
         except Exception as e:
-            logger.error(f"Error processing trade: {str(e)}", exc_info=True)
+            self.log_trade_error(trade, LIVE_STRATEGY, "Error processing trade for strategy %s: %s", e)
             return False
 
+    async def evaluate_shadow_trade(
+        self,
+        strategy: str,
+        config: TradingConfig,
+        trade: TradeData,
+        event: Optional[Dict[str, Any]],
+        state: PositionState
+    ) -> Optional[UpdateOne]:
+        """Evaluate a shadow strategy against in-memory data.
+
+        Returns the upsert for the test database instead of writing it, so all
+        shadow decisions of a tick go out in a single bulk write. Discord
+        alerts are queued for `send_shadow_alerts`.
+        """
+        shadow_trade = replace(trade, highest_profit=state.highest_profit, curr_odds=None)
+        try:
+            shadow_trade.curr_odds = self.parse_current_odds(shadow_trade, event)
+            position, decision = await self.evaluate_tpsl(shadow_trade, config)
+            curr_profit = self.calculate_profit(shadow_trade.entry_odds,
+                                                shadow_trade.curr_odds,
+                                                shadow_trade.prediction_idx)
+        except Exception as e:
+            self.log_trade_error(shadow_trade, strategy, "Error evaluating shadow strategy %s: %s", e)
+            return None
+
+        self.log_decision(shadow_trade, strategy, position, decision, curr_profit)
+
+        if decision.value not in ["HOLD"] and shadow_trade.volume > 100_000 and settings.shadow_send_discord:
+            self.shadow_alerts.append((strategy, shadow_trade, event, curr_profit, decision))
+
+        state.highest_profit = max(shadow_trade.highest_profit, curr_profit)
+        state.closed = position == Position.CLOSE
+
+        document = self.build_tpsl_document(shadow_trade, curr_profit, position, decision)
+        document["$set"].update({
+            'strategy': strategy,
+            'highest_profit': state.highest_profit,
+            'take_profit_threshold': config.TAKE_PROFIT_THRESHOLD,
+            'stop_loss_threshold': config.STOP_LOSS_THRESHOLD,
+        })
+        filter = {
+            'strategy': strategy,
+            'hash_id': shadow_trade.hash_id,
+            'prediction_id': shadow_trade.prediction_id,
+            'option_id': shadow_trade.option_id,
+        }
+        return UpdateOne(filter, document, upsert=True)
+
+    async def send_shadow_alerts(self) -> None:
+        """Send queued shadow Discord alerts; a failing webhook is logged and skipped."""
+        alerts, self.shadow_alerts = self.shadow_alerts, []
+        for strategy, trade, event, profit, decision in alerts:
+            try:
+                sent_poly_shadow_discord(
+                    f"- Strategy: `{strategy}`\n"
+                    + await self.format_decision_message(trade, event, profit, decision)
+                )
+            except Exception as e:
+                logger.error("Error sending shadow alert for strategy %s: %s", strategy, e)
+
     async def run(self) -> None:
-        """Main entry point to process all open trades."""
+        """Main entry point to process all open trades.
+
+        Predictions, position state and events are read once per tick and
+        shared by the live strategy and every shadow strategy.
+        """
+        self.tick_counts = defaultdict(Counter)
+        self.shadow_alerts = []
+        started = time.perf_counter()
+        # Taken before any read, so the next reconcile also re-reads this tick's own writes
+        tick_ts = datetime.now().timestamp()
         try:
             predictions = await self.mongo_client.find(
                 settings.poly_predictions_collection_name,
@@ -239,49 +533,84 @@ class TradingBot:
                     # "open_position":"CLOSE"
                 }
             )
+            states = await self.restore_position_states(
+                [prediction["prediction_id"] for prediction in predictions]
+            )
 
+            # Check xem tpsl da close position cho predicion nay chua, o tung strategy
+            pending = []
             for prediction in predictions:
-                # Check xem tpsl da close position cho predicion nay chua
-                tpsl_record = await self.mongo_client.find_one(
-                    "tpsl_polyxbt",
-                    {
-                        "prediction_id":prediction["prediction_id"],
-                        "tpsl_open_position": 'CLOSE'
-                    }
+                open_strategies = [
+                    strategy for strategy, strategy_states in states.items()
+                    if not strategy_states.get(prediction["prediction_id"], PositionState()).closed
+                ]
+                if open_strategies:
+                    pending.append((prediction, open_strategies))
+
+            events = await self.load_events(
+                list({prediction["hash_id"] for prediction, _ in pending})
+            )
+
+            shadow_ops = []
+            for prediction, open_strategies in pending:
+                live_state = states[LIVE_STRATEGY].setdefault(prediction["prediction_id"], PositionState())
+                trade = TradeData(
+                    prediction_id=prediction['prediction_id'],
+                    prediction = prediction['detailed_prediction']['prediction'],
+                    hash_id=prediction['hash_id'],
+                    option_id=prediction['detailed_prediction']['option_id'],
+                    entry_odds=prediction['detailed_prediction']['odds'],
+                    prediction_idx=prediction['detailed_prediction']['prediction_idx'],
+                    volume=prediction["volume"],
+                    created_at=prediction["created_at"],
+                    option="",
+                    highest_profit=live_state.highest_profit
                 )
-                if not tpsl_record:
-                    tpsl_record = await self.mongo_client.find_one(
-                        "tpsl_polyxbt",
-                        {
-                            "prediction_id":prediction["prediction_id"],
-                        }
-                    )
-                    if not tpsl_record: tpsl_record = {}
-                    highest_profit = tpsl_record.get('highest_profit',0)
-                    trade = TradeData(
-                        prediction_id=prediction['prediction_id'],
-                        prediction = prediction['detailed_prediction']['prediction'],
-                        hash_id=prediction['hash_id'],
-                        option_id=prediction['detailed_prediction']['option_id'],
-                        entry_odds=prediction['detailed_prediction']['odds'],
-                        prediction_idx=prediction['detailed_prediction']['prediction_idx'],
-                        volume=prediction["volume"],
-                        created_at=prediction["created_at"],
-                        option="",
-                        highest_profit=highest_profit
+                event = events.get(trade.hash_id)
+
+                if LIVE_STRATEGY in open_strategies:
+                    await self.process_trade(trade, event, live_state)
+
+                for strategy in open_strategies:
+                    if strategy == LIVE_STRATEGY:
+                        continue
+                    op = await self.evaluate_shadow_trade(
+                        strategy,
+                        self.shadow_configs[strategy],
+                        trade,
+                        event,
+                        states[strategy].setdefault(trade.prediction_id, PositionState())
                     )
-                    
-                    await self.process_trade(trade)
+                    if op is not None:
+                        shadow_ops.append(op)
+
+            if shadow_ops:
+                await self.test_mongo_client.upsert_many(
+                    settings.tpsl_shadow_collection_name,
+                    shadow_ops
+                )
+            await self.send_shadow_alerts()
+
+            self.save_position_states(tick_ts, states)
                 
         except Exception as e:
-            logger.error(f"Error in main loop: {str(e)}", exc_info=True)
+            logger.error("Error in main loop: %s", e, exc_info=True)
+        finally:
+            logger.info(
+                "Tick summary",
+                extra={
+                    "counts": {strategy: dict(counts) for strategy, counts in self.tick_counts.items()},
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+                }
+            )
 async def run_cron_job():
     config = TradingConfig()
     main_client = AsyncMongoManager(DISTILLED_DATABASE_NAME)
     test_client = AsyncMongoManager(DISTILLED_TEST_DATABASE_NAME)
-    bot = TradingBot(main_client, test_client, config)
+    bot = TradingBot(main_client, test_client, config, SHADOW_CONFIGS)
 
-    await bot.run()
+    async with profiler.profile_tick(bot):
+        await bot.run()
     
 
 
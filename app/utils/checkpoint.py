@@ -0,0 +1,91 @@
+import json
+import logging
+import mmap
+import os
+import struct
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# File layout: HEADER | strategy names (JSON) | RECORD * count | prediction_id blob
+MAGIC = b"TPSLCKPT"
+VERSION = 2
+# magic, version, checkpoint timestamp, strategies size, record count, key blob size
+HEADER = struct.Struct("<8sHdIII")
+# key offset, key length, strategy index, closed, highest profit
+RECORD = struct.Struct("<IHH?d")
+
+# strategy -> prediction_id -> (highest_profit, closed)
+CheckpointStates = Dict[str, Dict[str, Tuple[float, bool]]]
+
+
+def save_checkpoint(path: str, checkpoint_ts: float, states: CheckpointStates) -> None:
+    """Write position states to `path` atomically through a memory-mapped temp file."""
+    strategies = list(states)
+    strategies_blob = json.dumps(strategies).encode()
+    rows = [
+        (strategy_idx, prediction_id.encode(), state)
+        for strategy_idx, strategy in enumerate(strategies)
+        for prediction_id, state in states[strategy].items()
+    ]
+    keys_size = sum(len(key) for _, key, _ in rows)
+    records_offset = HEADER.size + len(strategies_blob)
+    keys_offset = records_offset + RECORD.size * len(rows)
+    total_size = keys_offset + keys_size
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb+") as f:
+        f.truncate(total_size)
+        with mmap.mmap(f.fileno(), total_size) as mm:
+            HEADER.pack_into(mm, 0, MAGIC, VERSION, checkpoint_ts, len(strategies_blob), len(rows), keys_size)
+            mm[HEADER.size:records_offset] = strategies_blob
+
+            key_cursor = 0
+            for i, (strategy_idx, key, (highest_profit, closed)) in enumerate(rows):
+                RECORD.pack_into(
+                    mm, records_offset + i * RECORD.size,
+                    key_cursor, len(key), strategy_idx, closed, highest_profit
+                )
+                mm[keys_offset + key_cursor:keys_offset + key_cursor + len(key)] = key
+                key_cursor += len(key)
+            mm.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path: str) -> Optional[Tuple[float, CheckpointStates]]:
+    """Read a checkpoint written by `save_checkpoint`, or None if missing or unreadable."""
+    try:
+        return _read_checkpoint(path)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, TypeError, KeyError, IndexError, struct.error) as e:
+        logger.warning("Ignoring unreadable checkpoint %s: %s", path, e)
+        return None
+
+
+def _read_checkpoint(path: str) -> Tuple[float, CheckpointStates]:
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < HEADER.size:
+            raise ValueError("file smaller than header")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            magic, version, checkpoint_ts, strategies_size, count, keys_size = HEADER.unpack_from(mm, 0)
+            records_offset = HEADER.size + strategies_size
+            keys_offset = records_offset + RECORD.size * count
+            if magic != MAGIC or version != VERSION or keys_offset + keys_size != size:
+                raise ValueError("bad header")
+
+            strategies = json.loads(mm[HEADER.size:records_offset])
+            states = {strategy: {} for strategy in strategies}
+            for i in range(count):
+                key_offset, key_len, strategy_idx, closed, highest_profit = RECORD.unpack_from(
+                    mm, records_offset + i * RECORD.size
+                )
+                prediction_id = mm[keys_offset + key_offset:keys_offset + key_offset + key_len].decode()
+                states[strategies[strategy_idx]][prediction_id] = (highest_profit, closed)
+
+    return checkpoint_ts, states
@@ -18,4 +18,9 @@ def sent_poly_predictions_discord(data):
 def sent_poly_win_loss_discord(data):
     webhook = DiscordWebhook(url=settings.poly_win_loss_discord_webhook_url, content=f"{data}")
     response = webhook.execute()
+    return response
+
+def sent_poly_shadow_discord(data):
+    webhook = DiscordWebhook(url=settings.poly_shadow_discord_webhook_url, content=f"{data[:2000]}")
+    response = webhook.execute()
     return response
\ No newline at end of file
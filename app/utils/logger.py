@@ -0,0 +1,108 @@
+import atexit
+import json
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+from app.config import settings
+
+# Structured fields callers may pass through `extra=` and that end up in the JSON record
+STRUCTURED_FIELDS = (
+    "strategy",
+    "prediction_id",
+    "hash_id",
+    "option_id",
+    "decision",
+    "position",
+    "profit",
+    "highest_profit",
+    "counts",
+    "duration_ms",
+)
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Render a record as a single JSON line with its structured fields."""
+
+    def format(self, record):
+        payload = {
+            "ts": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            if hasattr(record, field):
+                payload[field] = getattr(record, field)
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload["exc_info"] = record.exc_text
+        return json.dumps(payload, default=str)
+
+
+class HoldSampler:
+    """Keep one in every `every` HOLD lines, everything else untouched.
+
+    Checked by the caller before the log record and its fields are built.
+    """
+
+    def __init__(self, every):
+        self.every = max(int(every), 1)
+        self.seen = 0
+
+    def sample(self, decision):
+        if decision != "HOLD":
+            return True
+        self.seen += 1
+        return (self.seen - 1) % self.every == 0
+
+
+class DeferredQueueHandler(QueueHandler):
+    """Queue the record with its message unformatted, so formatting happens on the listener thread.
+
+    Arguments are rendered when the listener gets to the record, so only pass
+    immutable values (str, numbers, enum values), never TradeData, lists of
+    odds or other objects that may change afterwards. Records carrying an
+    exception are rendered here instead, so their frames are not kept alive
+    in the queue.
+    """
+
+    traceback_formatter = logging.Formatter()
+
+    def prepare(self, record):
+        if record.exc_info:
+            record.msg = record.getMessage()
+            record.args = None
+            record.exc_text = self.traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging():
+    """Route all logging through a queue drained by a background thread writing JSON to stdout."""
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+
+    queue_handler = DeferredQueueHandler(log_queue)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(settings.log_level)
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+hold_sampler = HoldSampler(settings.log_hold_sample_every)
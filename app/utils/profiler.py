@@ -0,0 +1,198 @@
+import contextlib
+import contextvars
+import cProfile
+import functools
+import logging
+import os
+import signal
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from app.config import settings
+from app.database.mongodb import AsyncMongoManager
+
+logger = logging.getLogger(__name__)
+
+MONGO_METHODS = (
+    "insert_one",
+    "insert_many",
+    "upsert_many",
+    "update_one",
+    "update_many",
+    "delete_many",
+    "find_one",
+    "find_one_and_update",
+    "find",
+    "aggregate",
+    "distinct",
+)
+
+_current_trade = contextvars.ContextVar("profiled_trade", default=None)
+
+
+@dataclass
+class TradeTiming:
+    prediction_id: str
+    hash_id: str
+    wall: float = 0
+    cpu: float = 0
+    mongo_wall: float = 0
+    mongo_calls: int = 0
+
+
+@dataclass
+class CallStats:
+    calls: int = 0
+    total: float = 0
+    max: float = 0
+
+    def add(self, elapsed):
+        self.calls += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+
+
+@dataclass
+class ProfileSession:
+    """Profiling state for a single tick: CPU profile, CPU stack samples and wall/await timings."""
+
+    bot: object
+    cpu_profile: cProfile.Profile = field(default_factory=cProfile.Profile)
+    cpu_stacks: Counter = field(default_factory=Counter)
+    wall_stacks: Counter = field(default_factory=Counter)
+    call_stats: dict = field(default_factory=lambda: defaultdict(CallStats))
+    trades: list = field(default_factory=list)
+    wall: float = 0
+    cpu: float = 0
+
+    def start(self):
+        self._patch_mongo()
+        self.bot.process_trade = self._wrap_process_trade(self.bot.process_trade)
+        self._previous_sigprof = signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, settings.profile_sample_interval, settings.profile_sample_interval)
+        self._started = (time.perf_counter(), time.process_time())
+        self.cpu_profile.enable()
+
+    def stop(self):
+        self.cpu_profile.disable()
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, self._previous_sigprof)
+        del self.bot.process_trade
+        self._unpatch_mongo()
+        self.wall = time.perf_counter() - self._started[0]
+        self.cpu = time.process_time() - self._started[1]
+
+    def _sample(self, signum, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        self.cpu_stacks[";".join(reversed(stack))] += 1
+
+    def _patch_mongo(self):
+        self._mongo_originals = {name: AsyncMongoManager.__dict__[name] for name in MONGO_METHODS}
+        for name, method in self._mongo_originals.items():
+            setattr(AsyncMongoManager, name, self._wrap_mongo_call(name, method))
+
+    def _unpatch_mongo(self):
+        for name, method in self._mongo_originals.items():
+            setattr(AsyncMongoManager, name, method)
+
+    def _wrap_mongo_call(self, name, method):
+        @functools.wraps(method)
+        async def wrapper(manager, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await method(manager, *args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                label = f"AsyncMongoManager.{name}[{manager.db}]"
+                self.call_stats[label].add(elapsed)
+                trade = _current_trade.get()
+                if trade is not None:
+                    trade.mongo_wall += elapsed
+                    trade.mongo_calls += 1
+                    self.wall_stacks[f"run;process_trade;{label}"] += int(elapsed * 1e6)
+                else:
+                    self.wall_stacks[f"run;{label}"] += int(elapsed * 1e6)
+        return wrapper
+
+    def _wrap_process_trade(self, process_trade):
+        @functools.wraps(process_trade)
+        async def wrapper(trade, *args, **kwargs):
+            timing = TradeTiming(trade.prediction_id, trade.hash_id)
+            token = _current_trade.set(timing)
+            started = (time.perf_counter(), time.thread_time())
+            try:
+                return await process_trade(trade, *args, **kwargs)
+            finally:
+                timing.wall = time.perf_counter() - started[0]
+                timing.cpu = time.thread_time() - started[1]
+                _current_trade.reset(token)
+                self.trades.append(timing)
+                self.call_stats["TradingBot.process_trade"].add(timing.wall)
+                self.wall_stacks["run;process_trade"] += max(int((timing.wall - timing.mongo_wall) * 1e6), 0)
+        return wrapper
+
+    def write(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.cpu_profile.dump_stats(os.path.join(directory, "cpu.prof"))
+        for name, stacks in (("cpu.collapsed", self.cpu_stacks), ("wall.collapsed", self.wall_stacks)):
+            with open(os.path.join(directory, name), "w") as f:
+                for stack, weight in stacks.most_common():
+                    f.write(f"{stack} {weight}\n")
+
+        with open(os.path.join(directory, "report.txt"), "w") as f:
+            f.write(f"Tick wall: {self.wall * 1000:.1f}ms, cpu: {self.cpu * 1000:.1f}ms, trades: {len(self.trades)}\n\n")
+            f.write("Calls (count, total ms, mean ms, max ms):\n")
+            for label, stats in sorted(self.call_stats.items(), key=lambda item: -item[1].total):
+                f.write(
+                    f"  {label}: {stats.calls}, {stats.total * 1000:.1f}, "
+                    f"{stats.total / stats.calls * 1000:.2f}, {stats.max * 1000:.2f}\n"
+                )
+            f.write(f"\nTop {settings.profile_top_n} slowest trades (wall ms, cpu ms, mongo await ms, mongo calls):\n")
+            for trade in sorted(self.trades, key=lambda t: -t.wall)[:settings.profile_top_n]:
+                f.write(
+                    f"  prediction_id={trade.prediction_id} hash_id={trade.hash_id}: "
+                    f"{trade.wall * 1000:.1f}, {trade.cpu * 1000:.1f}, "
+                    f"{trade.mongo_wall * 1000:.1f}, {trade.mongo_calls}\n"
+                )
+
+
+class TickProfiler:
+    """Profiles the next N ticks, requested through PROFILE_TICKS or SIGUSR1."""
+
+    def __init__(self, ticks=0):
+        self.remaining = ticks
+
+    def request(self, ticks):
+        self.remaining += ticks
+
+    def install_signal_handler(self):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: self.request(settings.profile_signal_ticks))
+
+    @contextlib.asynccontextmanager
+    async def profile_tick(self, bot):
+        if self.remaining <= 0:
+            yield
+            return
+
+        self.remaining -= 1
+        session = ProfileSession(bot)
+        session.start()
+        try:
+            yield
+        finally:
+            session.stop()
+            directory = os.path.join(settings.profile_dir, datetime.now().strftime("tick-%Y%m%d-%H%M%S"))
+            try:
+                session.write(directory)
+                logger.info("Wrote tick profile to %s", directory)
+            except OSError as e:
+                logger.error("Error writing tick profile: %s", e, exc_info=True)
+
+
+profiler = TickProfiler(settings.profile_ticks)
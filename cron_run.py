@@ -2,8 +2,10 @@ import asyncio
 import schedule
 import time
 from app.run import run_cron_job
+from app.utils.profiler import profiler
 
 print('CRONJOB START !!!')
+profiler.install_signal_handler()
 
 def task():
     loop = asyncio.get_event_loop()